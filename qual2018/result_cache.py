@@ -0,0 +1 @@
+../qual2021/result_cache.py
\ No newline at end of file
@@ -27,31 +27,54 @@ import time
 import numpy as np
 import random
 
+from result_cache import ResultCache
 
-def parallel():
+
+def parallel(seed=None):
     """ Run each file in a different process """
     inputs = ['a_example', 'b_should_be_easy', 'c_no_hurry', 'd_metropolis', 'e_high_bonus']
     n_proc = min(len(inputs), multiprocessing.cpu_count())
-    joblib.Parallel(n_jobs=n_proc)(joblib.delayed(run_simulation)(i) for i in inputs)
-
-
-def run_simulation(f):
-    """ Run simulation for given file name """
+    joblib.Parallel(n_jobs=n_proc)(joblib.delayed(run_simulation)(i, seed=seed) for i in inputs)
+
+
+def run_simulation(f, seed=None, use_cache=True):
+    """
+    Run simulation for given file name, unless its result is already cached
+    :param seed: int, default None
+        Random seed used to split rides. Results are cached per seed, so new searches need a different seed. When None,
+        each run draws a different split and the cache is not used.
+    """
+    cache = ResultCache(sources=[__file__])
+    params = {'seed': seed}
+    use_cache = use_cache and seed is not None
+    if use_cache:
+        cached = cache.get(f + '.in', 'qual2018-smarter', params)
+        if cached is not None:
+            output, score = cached
+            write_solution(f + Simulation.out_suffix + '.out', output)
+            return score
+
+    random.seed(seed)
     sim = Simulation(f)
     sim.run()
+    score = sim.get_score()
+    if use_cache:
+        cache.put(f + '.in', 'qual2018-smarter', params, sim.get_output(), score)
+    return score
 
 
-def main():
+def main(seed=None):
     # for f in ['a_example', 'b_should_be_easy', 'c_no_hurry', 'd_metropolis', 'e_high_bonus']:
     for f in ['e_high_bonus']:
-        run_simulation(f)
+        run_simulation(f, seed=seed)
 
 
 class Simulation:
 
+    out_suffix = '_sm'
+
     def __init__(self, name):
         self.name = name
-        self.out_suffix = '_sm'
         self.inputs = get_obj(name + '.in')
         self.fleet = [Vehicle() for _ in range(self.inputs.vehicles)]
 
@@ -104,13 +127,31 @@ class Simulation:
 
     def generate_solution(self):
         """ Generates output file """
-        fname = self.name + self.out_suffix + '.out'
-        f = open(fname, 'w')
-        for i, v in enumerate(self.fleet):
+        write_solution(self.name + self.out_suffix + '.out', self.get_output())
+
+    def get_output(self):
+        """ Output file contents """
+        output = ''
+        for v in self.fleet:
             rides_numbers = ' '.join([str(r.ride_n) for r in v.rides])
-            f.write('%s %s\n' % (len(v.rides), rides_numbers))
+            output += '%s %s\n' % (len(v.rides), rides_numbers)
 
-        print('Written to %s' % fname)
+        return output
+
+    def get_score(self):
+        """ Computes the score of the rides assigned to the fleet """
+        score = 0
+        for v in self.fleet:
+            x, y, t = 0, 0, 0
+            for r in v.rides:
+                t += abs(r.initial_x - x) + abs(r.initial_y - y)
+                bonus = self.bonus if t <= r.earliest_start else 0
+                t = max(t, r.earliest_start) + r.distance
+                if t <= r.latest_finish and t <= self.T:
+                    score += r.distance + bonus
+                x, y = r.final_x, r.final_y
+
+        return score
 
     def update_vehicles_states(self, dt):
         """ Updates states for each vehicle in fleet """
@@ -268,6 +309,14 @@ class Vehicle:
         self.ride_finish = dt + dvs + waiting_time + ride.distance
 
 
+def write_solution(fname, output):
+    """ Writes output file """
+    f = open(fname, 'w')
+    f.write(output)
+    f.close()
+    print('Written to %s' % fname)
+
+
 def get_rides_objects(rides):
     rides_mat = [list(line[:-1].split(' ')) for line in rides]
     return [Ride(ride_n, r) for ride_n, r in enumerate(rides_mat)]
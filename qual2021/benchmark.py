@@ -0,0 +1,166 @@
+"""
+Benchmark of the qual2021 solver stages.
+
+For each input, the stages of main.solve (parsing, get_solution and writing the output as run does) are timed
+separately, keeping the best of several repeats, along with the peak memory each stage allocates (traced by
+tracemalloc in another run) and the simulated score of the solution. Results are appended to outputs/benchmark.csv,
+tagged with the current git revision, and compared with the last recorded run of a different revision, so performance
+regressions between versions show up. Only changes above the NOISE threshold are reported.
+"""
+import csv
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from main import read_file, get_solution, get_output, write_output
+from simulator import City, read_schedule, simulate
+from generator import generate_city, write_city
+
+STAGES = ("parse", "solve", "output")
+
+# Synthetic cities: name -> (intersections, streets, cars, path length, D)
+SYNTHETIC = {
+    "synth_s": (1000, 5000, 1000, 20, 2000),
+    "synth_m": (10000, 50000, 10000, 40, 5000),
+    "synth_l": (100000, 500000, 50000, 60, 10000),
+}
+
+RESULTS_FILE = os.path.join("outputs", "benchmark.csv")
+
+# Timing changes smaller than this fraction, or than MIN_CHANGE seconds, are reported as noise
+NOISE = 0.1
+MIN_CHANGE = 0.005
+
+
+def timed(f, *args):
+    """ Runs f, returns (result, seconds) """
+    t0 = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - t0
+
+
+def traced(f, *args):
+    """ Runs f while tracemalloc is running, returns (result, peak memory allocated by f in MB) """
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    result = f(*args)
+    return result, (tracemalloc.get_traced_memory()[1] - start) / 2 ** 20
+
+
+def get_output_path(file_name):
+    # Kept apart from the solutions written by run, sweep and optimizer
+    return os.path.join("outputs", file_name + "_bench_out.txt")
+
+
+def write(file_name, sol):
+    """ Writes the solution as run does """
+    write_output(get_output_path(file_name), get_output(sol))
+
+
+def run_stages(file_name, measure):
+    """
+    Runs the solver stages for given input file, each one measured by measure
+    :return: tuple
+        (parsed input, list with the measure of each stage)
+    """
+    (first_row, streets, paths), parse = measure(read_file, file_name + ".txt")
+    sol, solve = measure(get_solution, first_row, streets, paths)
+    _, output = measure(write, file_name, sol)
+    return (first_row, streets, paths), [parse, solve, output]
+
+
+def benchmark(file_name, score=True, repeats=5):
+    """ Benchmarks the solver stages for given input file, keeping the best time of each stage over repeats """
+    # Tracing slows down allocations a lot, so stages are timed and traced in separate runs
+    runs = [run_stages(file_name, timed) for _ in range(repeats)]
+    first_row, streets, paths = runs[0][0]
+    seconds = [min(stage) for stage in zip(*[r[1] for r in runs])]
+    tracemalloc.start()
+    try:
+        _, memory = run_stages(file_name, traced)
+    finally:
+        tracemalloc.stop()
+
+    result = {"input": file_name}
+    for stage, stage_s, stage_mb in zip(STAGES, seconds, memory):
+        result[stage + "_s"] = round(stage_s, 4)
+        result[stage + "_mb"] = round(stage_mb, 2)
+    if score:
+        city = City(first_row, streets, paths)
+        with open(get_output_path(file_name), "r") as f_obj:
+            result["score"] = simulate(city, read_schedule(city, f_obj.read().split("\n")))
+
+    return result
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_results():
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE, "r", newline="") as f_obj:
+        return list(csv.DictReader(f_obj))
+
+
+def save_results(results):
+    """ Appends results to benchmark file, rewriting it when its columns changed """
+    previous = load_results()
+    fieldnames = list(results[0].keys())
+    if previous and list(previous[0].keys()) != fieldnames:
+        fieldnames += [k for k in previous[0].keys() if k not in fieldnames]
+        results = previous + results
+    elif previous:
+        with open(RESULTS_FILE, "a", newline="") as f_obj:
+            csv.DictWriter(f_obj, fieldnames=fieldnames).writerows(results)
+        return
+
+    with open(RESULTS_FILE, "w", newline="") as f_obj:
+        writer = csv.DictWriter(f_obj, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def compare(result, previous):
+    """ Prints stage timings of result against the last previous result of a different revision """
+    prev = [r for r in previous if r["input"] == result["input"] and r["revision"] != result["revision"]]
+    line = "%s:" % result["input"]
+    for stage in STAGES:
+        line += " %s=%.3fs/%.1fMB" % (stage, result[stage + "_s"], result[stage + "_mb"])
+        # Older results may not have this stage
+        if prev and prev[-1].get(stage + "_s"):
+            old = float(prev[-1][stage + "_s"])
+            change = result[stage + "_s"] - old
+            if old > 0 and abs(change) > max(NOISE * old, MIN_CHANGE):
+                line += " (%+.0f%%)" % (100 * change / old)
+    if "score" in result:
+        line += " score=%d" % result["score"]
+    if prev:
+        line += " [vs %s]" % prev[-1]["revision"]
+    print(line)
+
+
+def main(file_names, score=True):
+    previous = load_results()
+    revision = get_revision()
+    run_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    results = []
+    for f in file_names:
+        if f in SYNTHETIC and not os.path.exists(os.path.join("inputs", f + ".txt")):
+            I, S, V, path_len, D = SYNTHETIC[f]
+            write_city(f, *generate_city(I, S, V, path_len=path_len, D=D))
+        result = {"run": run_time, "revision": revision, **benchmark(f, score=score)}
+        compare(result, previous)
+        results.append(result)
+
+    save_results(results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["a", "b", "c", "d", "e", "f", "synth_s", "synth_m"])
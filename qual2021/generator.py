@@ -0,0 +1,74 @@
+"""
+Synthetic city generator, in the 2021 qualification round input format.
+
+Intersections are first connected in a ring, so every intersection has at least one outgoing street, and the rest of
+the streets join random pairs of intersections. Car paths are random walks that do not repeat streets.
+"""
+import os
+import random
+import string
+import sys
+
+
+def street_name(n):
+    """ Street name in the same style as the official inputs ("a", "b", ..., "ba", ...) """
+    name = ""
+    while True:
+        name = string.ascii_lowercase[n % 26] + name
+        n //= 26
+        if n == 0:
+            return name
+
+
+def generate_city(n_intersections, n_streets, n_cars, path_len=20, D=1000, F=1000, max_len=None, seed=0):
+    """
+    Generates a random city
+    :param path_len: int, default 20
+        Maximum number of streets in each car path
+    :param max_len: int, default None
+        Maximum street length, D // path_len by default
+    :return: tuple
+        (first_row, streets, paths) in the same format returned by read_file
+    """
+    assert n_intersections > 1 and n_streets >= n_intersections
+    rnd = random.Random(seed)
+    max_len = max_len or max(1, D // path_len)
+    ends = [(i, (i + 1) % n_intersections) for i in range(n_intersections)]
+    while len(ends) < n_streets:
+        b, e = rnd.randrange(n_intersections), rnd.randrange(n_intersections)
+        if b != e:
+            ends.append((b, e))
+    streets = [(b, e, street_name(n), rnd.randint(1, max_len)) for n, (b, e) in enumerate(ends)]
+
+    outgoing = [[] for _ in range(n_intersections)]
+    for n, (b, _) in enumerate(ends):
+        outgoing[b].append(n)
+
+    paths = []
+    while len(paths) < n_cars:
+        s = rnd.randrange(n_streets)
+        path = [s]
+        while len(path) < path_len:
+            options = [n for n in outgoing[ends[s][1]] if n not in path]
+            if not options:
+                break
+            s = rnd.choice(options)
+            path.append(s)
+        if len(path) > 1:
+            paths.append((len(path), *[streets[n][2] for n in path]))
+
+    return [D, n_intersections, n_streets, n_cars, F], streets, paths
+
+
+def write_city(file_name, first_row, streets, paths):
+    """ Writes city to inputs folder """
+    with open(os.path.join("inputs", file_name + ".txt"), "w") as f_obj:
+        f_obj.write(" ".join(str(x) for x in first_row) + "\n")
+        f_obj.writelines(["%d %d %s %d\n" % s for s in streets])
+        f_obj.writelines([" ".join(str(x) for x in p) + "\n" for p in paths])
+
+
+if __name__ == "__main__":
+    # python generator.py name intersections streets cars [path_len] [D]
+    name, *args = sys.argv[1:]
+    write_city(name, *generate_city(*[int(a) for a in args]))
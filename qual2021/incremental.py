@@ -0,0 +1,276 @@
+"""
+Incremental re-simulation of qual2021 schedules.
+
+Changing the cycle of one intersection only changes the crossing times of the cars queued in its streets, and then
+of the cars queued behind those cars further down their paths. IncrementalSimulation keeps each car's timeline
+(arrival and crossing time at each path street), each street's queue ordered by arrival and an index from each
+intersection to the cars that cross it. When a cycle changes, only the queues of that intersection whose window
+changed are recomputed, and changes are propagated forward in time, skipping in each queue from the first car whose
+crossing time is unchanged to the next car that was queued or unqueued.
+
+Cost is proportional to the number of crossings a change moves, not to the size of the city. On small or lightly
+congested inputs that makes evaluations orders of magnitude faster than a full simulation (b: ~3500/s, e: ~5000/s),
+but on large congested inputs a single cycle change moves around a thousand crossings downstream, so expect tens to a
+few hundred evaluations per second (d: ~200/s, f: ~30/s with the optimizer moves, against ~1.5 and ~4 full
+simulations per second), only about an order of magnitude faster than simulate.
+"""
+import bisect
+import heapq
+import random
+import sys
+import time
+
+from main import read_city, read_output
+from simulator import get_green_windows, next_green, simulate
+
+
+class IncrementalSimulation:
+
+    def __init__(self, city, schedule):
+        self.city = city
+        self.schedule = {i: list(cycle) for i, cycle in schedule.items()}
+        self.windows = get_green_windows(city, self.schedule)
+        self.score, self.arrivals, self.crossings, self.finish = simulate(city, self.schedule, timelines=True)
+        # Queue entries are (arrival time, car, step), sorted as cars are queued
+        self.queues = [[] for _ in range(city.S)]
+        # Intersection -> list of (car, step) for each car crossing it
+        self.cars_at = {}
+        for car, path in enumerate(city.paths):
+            for step, s in enumerate(path[:-1]):
+                self.cars_at.setdefault(city.street_end[s], []).append((car, step))
+                if self.arrivals[car][step] is not None:
+                    self.queues[s].append((self.arrivals[car][step], car, step))
+        for q in self.queues:
+            q.sort()
+        # Changes log, used to roll back an evaluated change
+        self._undo = []
+
+    def evaluate(self, i, cycle):
+        """ Returns score delta of replacing the cycle of intersection i, leaving the simulation unchanged """
+        delta = self.propose(i, cycle)
+        self.rollback()
+        return delta
+
+    def apply(self, i, cycle):
+        """ Replaces the cycle of intersection i and returns the score delta """
+        delta = self.propose(i, cycle)
+        self.commit()
+        return delta
+
+    def propose(self, i, cycle):
+        """ Replaces the cycle of intersection i and returns the score delta, until commit or rollback is called """
+        self._undo = []
+        return self._update(i, cycle)
+
+    def commit(self):
+        """ Keeps the proposed change """
+        self._undo = []
+
+    def rollback(self):
+        """ Reverts the proposed change """
+        for op in reversed(self._undo):
+            kind = op[0]
+            if kind == "crossing":
+                self.crossings[op[1]][op[2]] = op[3]
+            elif kind == "arrival":
+                self.arrivals[op[1]][op[2]] = op[3]
+            elif kind == "finish":
+                self.finish[op[1]] = op[2]
+            elif kind == "queue":
+                self._requeue(op[1], op[3], op[2])
+            elif kind == "window":
+                self.windows[op[1]] = op[2]
+            elif kind == "schedule":
+                self.schedule[op[1]] = op[2]
+            elif kind == "score":
+                self.score = op[1]
+        self._undo = []
+
+    def _update(self, i, cycle):
+        city = self.city
+        score = self.score
+        self._undo.append(("score", score))
+        self._undo.append(("schedule", i, self.schedule.get(i)))
+        old_streets = [s for s, _ in self.schedule.get(i, [])]
+        self.schedule[i] = list(cycle)
+        windows = get_green_windows(city, {i: self.schedule[i]})
+        changed = set()
+        for s in set(old_streets + [s for s, _ in cycle]):
+            # Moves like swaps keep the window of the streets outside the swapped range
+            if windows[s] != self.windows[s]:
+                changed.add(s)
+                self._undo.append(("window", s, self.windows[s]))
+                self.windows[s] = windows[s]
+
+        # Each queue whose window changed diverges, at most, from its first arrival
+        self._events = []
+        self._pending = {}
+        self._full = set()
+        first = {}
+        for car, step in self.cars_at.get(i, []):
+            t = self.arrivals[car][step]
+            s = city.paths[car][step]
+            if t is not None and s in changed and t < first.get(s, city.D + 1):
+                first[s] = t
+        for s, t in first.items():
+            self._full.add(s)
+            self._seed(s, t)
+        while self._events:
+            t, s = heapq.heappop(self._events)
+            pending = self._pending.get(s)
+            # Skip events superseded by an earlier seed of the same street
+            if pending is None or pending[0] != t:
+                continue
+            del self._pending[s]
+            full = s in self._full
+            self._full.discard(s)
+            self._recompute(s, pending, full)
+
+        return self.score - score
+
+    def _seed(self, s, t):
+        """ Marks street s queue to be recomputed, since a car was queued or unqueued at arrival time t """
+        pending = self._pending.get(s)
+        if pending is None:
+            self._pending[s] = [t]
+            heapq.heappush(self._events, (t, s))
+            return
+        if t < pending[0]:
+            heapq.heappush(self._events, (t, s))
+        bisect.insort(pending, t)
+
+    def _recompute(self, s, times, full):
+        """
+        Recomputes crossing times of street s queue, from the cars queued at the sorted arrival times, where the queue
+        changed. Unless full is True, it jumps from each unchanged crossing to the next queue change, and stops after
+        the last one. Queues whose window changed are recomputed in full, since a car crossing at its old time does not
+        mean the cars behind it do under the new window.
+        """
+        D = self.city.D
+        q = self.queues[s]
+        window = self.windows[s]
+        # Positions from which crossings may have changed
+        marks = [bisect.bisect_left(q, (t, -1, -1)) for t in times]
+        k, m = marks[0], 1
+        free, blocked = self._get_free(q, k)
+        while k < len(q):
+            while m < len(marks) and marks[m] <= k:
+                m += 1
+            arrival, car, step = q[k]
+            crossing = None if blocked else next_green(window, max(arrival, free))
+            if crossing is None or crossing >= D:
+                crossing, blocked = None, True
+            else:
+                free = crossing + 1
+            if crossing == self.crossings[car][step]:
+                # A car queued at a change can keep its old crossing, but the car behind it is not the same one
+                if not full and marks[m - 1] < k:
+                    if m == len(marks):
+                        break
+                    # Crossings are unchanged up to the next queue change
+                    k = marks[m]
+                    free, blocked = self._get_free(q, k)
+                    continue
+            else:
+                self._undo.append(("crossing", car, step, self.crossings[car][step]))
+                self.crossings[car][step] = crossing
+                self._move(car, step + 1, crossing)
+            k += 1
+
+    def _get_free(self, q, k):
+        """ Returns (first free second, blocked) for the car at position k of queue q, after the car ahead of it """
+        if k == 0:
+            return 0, False
+        _, car, step = q[k - 1]
+        prev = self.crossings[car][step]
+        if prev is None:
+            return 0, True
+        return prev + 1, False
+
+    def _move(self, car, step, crossing):
+        """ Updates the arrival of car at the end of its step street, given the crossing time of the previous one """
+        city = self.city
+        path = city.paths[car]
+        arrival = None
+        if crossing is not None:
+            arrival = crossing + city.street_len[path[step]]
+            if arrival > city.D:
+                arrival = None
+
+        if step == len(path) - 1:
+            old = self.finish[car]
+            if old is not None:
+                self.score -= city.F + city.D - old
+            if arrival is not None:
+                self.score += city.F + city.D - arrival
+            self._undo.append(("finish", car, old))
+            self.finish[car] = arrival
+            return
+
+        s = path[step]
+        old = self.arrivals[car][step]
+        self._undo.append(("arrival", car, step, old))
+        self.arrivals[car][step] = arrival
+        if old is not None or arrival is not None:
+            old_entry = None if old is None else (old, car, step)
+            new_entry = None if arrival is None else (arrival, car, step)
+            self._requeue(s, old_entry, new_entry)
+            self._undo.append(("queue", s, old_entry, new_entry))
+            for t in (old, arrival):
+                if t is not None:
+                    self._seed(s, t)
+        if arrival is None and self.crossings[car][step] is not None:
+            # Car does not reach this street anymore, so the rest of its path is dropped as well
+            self._undo.append(("crossing", car, step, self.crossings[car][step]))
+            self.crossings[car][step] = None
+            self._move(car, step + 1, None)
+
+    def _requeue(self, s, old_entry, new_entry):
+        """ Replaces old_entry by new_entry in street s queue, any of them can be None """
+        q = self.queues[s]
+        if old_entry is None:
+            bisect.insort(q, new_entry)
+            return
+        k = bisect.bisect_left(q, old_entry)
+        if new_entry is None:
+            del q[k]
+        elif (k == 0 or q[k - 1] < new_entry) and (k + 1 == len(q) or new_entry < q[k + 1]):
+            # Queue order is unchanged
+            q[k] = new_entry
+        else:
+            del q[k]
+            bisect.insort(q, new_entry)
+
+
+def check(city, schedule, n_moves=300, seed=0):
+    """
+    Checks incremental deltas against full simulations for random cycle changes. One of every three changes is
+    applied, and then all timelines are also compared.
+    :return: float
+        Incremental evaluations per second
+    """
+    rnd = random.Random(seed)
+    sim = IncrementalSimulation(city, schedule)
+    intersections = list(sim.schedule)
+    seconds = 0
+    for n in range(n_moves):
+        i = rnd.choice(intersections)
+        cycle = [(s, rnd.randint(0, 3)) for s, _ in sim.schedule[i]]
+        rnd.shuffle(cycle)
+        expected = simulate(city, {**sim.schedule, i: cycle}) - sim.score
+        t0 = time.perf_counter()
+        delta = sim.apply(i, cycle) if n % 3 == 0 else sim.evaluate(i, cycle)
+        seconds += time.perf_counter() - t0
+        assert delta == expected, "intersection %d: delta %d, expected %d" % (i, delta, expected)
+        if n % 3 == 0:
+            score, arrivals, crossings, finish = simulate(city, sim.schedule, timelines=True)
+            assert (score, arrivals, crossings, finish) == (sim.score, sim.arrivals, sim.crossings, sim.finish)
+
+    return n_moves / seconds
+
+
+if __name__ == "__main__":
+    # Checks against the solutions in outputs folder
+    for f in sys.argv[1:] or ("a", "b", "c", "d", "e", "f"):
+        city = read_city(f)
+        print("%s: ok (%.0f evaluations/s)" % (f, check(city, read_output(city, f))))
@@ -1,32 +1,101 @@
 import os
+from collections import Counter
+from itertools import accumulate
 
+from result_cache import ResultCache
+from simulator import City, read_schedule, next_green, simulate
 
-def run(file_name):
-    first_row, streets, paths = read_file(file_name + ".txt")
-    sol = get_solution(first_row, streets, paths)
-    with open(os.path.join("outputs", file_name + "_out.txt"), "w") as f_obj:
-        f_obj.writelines([str(row) + "\n" for row in sol])
 
+def run(file_name, factor=1.0, scale=0.3, by_arrival=False, use_cache=True):
+    output, score = solve(file_name, factor=factor, scale=scale, by_arrival=by_arrival, use_cache=use_cache)
+    write_output(os.path.join("outputs", file_name + "_out.txt"), output)
+    return score
+
+
+def solve(file_name, factor=1.0, scale=0.3, by_arrival=False, use_cache=True, inputs=None):
+    """
+    Solves and scores given file, reusing the cached result if it was already solved with the same parameters
+    :param inputs: tuple, default None
+        Already parsed (first_row, streets, paths), read from file if not given
+    :return: tuple
+        (output file contents, score)
+    """
+    # Results also depend on the simulator, which scores them
+    cache = ResultCache(sources=[__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.py")])
+    input_path = os.path.join("inputs", file_name + ".txt")
+    params = {"factor": factor, "scale": scale, "by_arrival": by_arrival}
+    if use_cache:
+        cached = cache.get(input_path, "qual2021", params)
+        if cached is not None:
+            return cached
+
+    first_row, streets, paths = inputs or read_file(file_name + ".txt")
+    sol = get_solution(first_row, streets, paths, factor=factor, scale=scale, by_arrival=by_arrival)
+    city = City(first_row, streets, paths)
+    score = simulate(city, read_schedule(city, sol))
+    output = get_output(sol)
+    cache.put(input_path, "qual2021", params, output, score)
+    return output, score
+
+
+def get_output(sol):
+    """ Output file contents of the rows returned by get_solution """
+    return "".join([str(row) + "\n" for row in sol])
+
+
+def write_output(path, output):
+    with open(path, "w") as f_obj:
+        f_obj.write(output)
+
+
+def read_city(file_name):
+    """ Reads input file (from inputs folder) into a City """
+    return City(*read_file(file_name + ".txt"))
 
-def read_file(file_name):
-    with open(os.path.join("inputs", file_name), "r") as f_obj:
-        rows = f_obj.read().split("\n")
-    first_row = [int(i) for i in rows[0].split()]
-    streets = []
-    for row in rows[1:1 + first_row[2]]:
-        r = row.split()
-        streets.append((int(r[0]), int(r[1]), r[2], int(r[3])))
-
-    paths = []
-    for row in rows[1 + first_row[2]:-1]:
-        r = row.split()
-        r[0] = int(r[0])
-        paths.append(tuple(r))
 
+def read_output(city, file_name):
+    """ Reads solution from outputs folder """
+    with open(os.path.join("outputs", file_name + "_out.txt"), "r") as f_obj:
+        return read_schedule(city, f_obj.read().split("\n"))
+
+
+def score_output(file_name):
+    """ Scores the solution written for given input file """
+    city = read_city(file_name)
+    return simulate(city, read_output(city, file_name))
+
+
+def read_file(file_name):
+    first_row, streets = read_streets(file_name)
+    paths = list(iter_paths(file_name, first_row[2]))
     assert len(paths) == first_row[3]
     return first_row, streets, paths
 
 
+def read_streets(file_name):
+    """ Reads first row and streets, without loading the car paths """
+    with open(os.path.join("inputs", file_name), "r") as f_obj:
+        first_row = [int(i) for i in f_obj.readline().split()]
+        streets = []
+        for _ in range(first_row[2]):
+            r = f_obj.readline().split()
+            streets.append((int(r[0]), int(r[1]), r[2], int(r[3])))
+
+    return first_row, streets
+
+
+def iter_paths(file_name, S):
+    """ Yields car paths one at a time, given the number of streets S """
+    with open(os.path.join("inputs", file_name), "r") as f_obj:
+        for _ in range(S + 1):
+            f_obj.readline()
+        for row in f_obj:
+            r = row.split()
+            if r:
+                r[0] = int(r[0])
+                yield tuple(r)
+
+
 def filter_paths(paths, D, streets, factor=1.0):
     streets_t = {s[2]: s[3] for s in streets}
     return [p for p in paths if get_path_time(p, streets_t) <= D * factor]
@@ -36,20 +105,57 @@ def get_path_time(p, streets_t):
     return sum(streets_t[s] for s in p[1:])
 
 
-def get_solution(first_row, streets, paths):
+def update_arrivals(arrivals, p, streets_t, D):
+    """
+    Adds the times at which the car of path p reaches the end of each street to the arrivals histogram of the street,
+    assuming the car never waits at a light. Last street of the path is not included, since cars do not cross its
+    intersection, and neither are arrivals at D or later, since those cars can not cross anymore.
+    """
+    # Car starts at the end of its first street
+    times = accumulate((streets_t[s] for s in p[2:-1]), initial=0)
+    for s, t in zip(p[1:-1], times):
+        if t >= D:
+            break
+        if s not in arrivals:
+            arrivals[s] = Counter()
+        arrivals[s][t] += 1
+
+
+def get_solution(first_row, streets, paths, factor=1.0, scale=0.3, by_arrival=False):
+    D = first_row[0]
+    paths = filter_paths(paths, D, streets, factor=factor)
+    street_cnt, street_cnt_b, int_streets, arrivals = get_street_counts(
+        first_row, streets, paths, by_arrival=by_arrival)
+
+    file_rows = [len(int_streets)]
+    for i, _int_st in int_streets.items():
+        schedules = get_schedules(_int_st, street_cnt, street_cnt_b, D, scale=scale, arrivals=arrivals)
+        file_rows += [i, len(_int_st), *schedules]
+
+    return file_rows
+
+
+def get_street_counts(first_row, streets, paths, by_arrival=False):
+    """
+    Computes the street statistics used to build the schedules, from already filtered paths.
+    Paths are only iterated once, so they can be streamed from the input file.
+    :return: tuple
+        (street counts, street counts beginning, intersection -> used streets, arrival times histogram per street or
+        None)
+    """
     D, I, S, V, F = first_row
-    paths = filter_paths(paths, D, streets, factor=1.0)
+    arrivals = {} if by_arrival else None
+    streets_t = {s[2]: s[3] for s in streets}
     street_ends = {s[2]: s[1] for s in streets}
-    # Street counts
+    # Street counts and street counts beginning
     street_cnt = {s: 0 for s in street_ends.keys()}
+    street_cnt_b = {s: 0 for s in street_ends.keys()}
     for p in paths:
         for _p in p[1:]:
             street_cnt[_p] += 1
-
-    # Street counts beginning
-    street_cnt_b = {s: 0 for s in street_ends.keys()}
-    for p in paths:
         street_cnt_b[p[1]] += 1
+        if by_arrival:
+            update_arrivals(arrivals, p, streets_t, D)
 
     int_streets = {}
     for st, i in street_ends.items():
@@ -59,26 +165,62 @@ def get_solution(first_row, streets, paths):
             else:
                 int_streets[i].append(st)
 
-    file_rows = [len(int_streets)]
-    for i, _int_st in int_streets.items():
-        if len(_int_st) == 1:
-            schedules = ["%s 1" % _int_st[0]]
-        else:
-            counts = {n: street_cnt[n] for n in _int_st}
-            b_counts = {n: street_cnt_b[n] for n in _int_st}
-            if max(b_counts.values()) == 0:
-                m = min(counts.values())
-                schedules = ["%s %s" % (s, max(1, int(x*0.3 // m))) for s, x in counts.items()]
-            else:
-                _int_st = sorted(_int_st, key=lambda x: b_counts[x], reverse=True)
-                m = min(counts.values())
-                schedules = ["%s %s" % (s, max(1, int(counts[s]*0.3 // m))) for s in _int_st]
-
-        file_rows += [i, len(_int_st), *schedules]
-
-    return file_rows
+    return street_cnt, street_cnt_b, int_streets, arrivals
+
+
+def get_schedules(_int_st, street_cnt, street_cnt_b, D, scale=0.3, arrivals=None):
+    """ Builds the "street duration" schedule rows of one intersection """
+    if len(_int_st) == 1:
+        return ["%s 1" % _int_st[0]]
+    if arrivals is not None:
+        return get_phased_schedules(_int_st, arrivals, D, scale=scale)
+
+    counts = {n: street_cnt[n] for n in _int_st}
+    b_counts = {n: street_cnt_b[n] for n in _int_st}
+    if max(b_counts.values()) == 0:
+        m = min(counts.values())
+        return ["%s %s" % (s, max(1, int(x*scale // m))) for s, x in counts.items()]
+    else:
+        _int_st = sorted(_int_st, key=lambda x: b_counts[x], reverse=True)
+        m = min(counts.values())
+        return ["%s %s" % (s, max(1, int(counts[s]*scale // m))) for s in _int_st]
+
+
+def get_phased_schedules(_int_st, arrivals, D, scale=0.3):
+    """
+    Builds the schedule rows of one intersection from the arrival times histogram of its streets.
+    Durations are sized by the cars that reach each street before D. Streets are ordered by their first arrival, and
+    then the cycle is rotated to the offset with the lowest total waiting time, simulating the queue of each street
+    with the histogram arrivals.
+    """
+    hists = {n: arrivals.get(n, Counter()) for n in _int_st}
+    counts = {n: sum(h.values()) for n, h in hists.items()}
+    m = min([x for x in counts.values() if x] or [1])
+    durations = {n: max(1, int(x*scale // m)) for n, x in counts.items()}
+    cycle_len = sum(durations.values())
+    times = {n: sorted(h.items()) for n, h in hists.items()}
+
+    order = sorted(_int_st, key=lambda x: (min(hists[x], default=D), -counts[x]))
+    best, best_wait = order, None
+    for k in range(len(order)):
+        rotated = order[k:] + order[:k]
+        wait, start = 0, 0
+        for n in rotated:
+            window = (cycle_len, start, durations[n])
+            free = 0
+            for t, cars in times[n]:
+                for _ in range(cars):
+                    crossing = next_green(window, max(t, free))
+                    free = crossing + 1
+                    # Cars that do not cross before D wait until the end
+                    wait += min(crossing, D) - t
+            start += durations[n]
+        if best_wait is None or wait < best_wait:
+            best, best_wait = rotated, wait
+
+    return ["%s %s" % (n, durations[n]) for n in best]
 
 
 if __name__ == "__main__":
     for f in ("a", "b", "c", "d", "e", "f"):
-        run(f)
+        print("%s: %d" % (f, run(f)))
@@ -0,0 +1,108 @@
+"""
+Time-boxed local search over qual2021 schedules.
+
+Search starts from the solution already in the outputs folder, such as the best one written by the sweep, or from the
+get_solution schedule if there is none yet. A random intersection is picked (weighted by the number of cars crossing
+it) and its cycle is changed by swapping two streets or by increasing/decreasing one green duration. Moves are scored
+with the incremental simulation and accepted if they do not decrease the score. Independent restarts, each one with
+its own random seed, can be run in parallel and the best schedule is kept, only replacing the output file when it
+improves its score.
+"""
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from main import read_file, read_output, get_solution
+from simulator import City, read_schedule, get_rows, simulate
+from incremental import IncrementalSimulation
+
+
+def run(file_name, seconds=60, n_jobs=1):
+    """ Optimizes the current solution for given file and writes the best schedule found, if it improves it """
+    seeds = list(range(n_jobs))
+    if n_jobs > 1:
+        with multiprocessing.Pool(n_jobs) as pool:
+            results = pool.starmap(optimize_file, [(file_name, seconds, s) for s in seeds])
+    else:
+        results = [optimize_file(file_name, seconds, seeds[0])]
+
+    score, start_score, rows = max(results, key=lambda x: x[0])
+    if score > start_score:
+        with open(os.path.join("outputs", file_name + "_out.txt"), "w") as f_obj:
+            f_obj.writelines([str(row) + "\n" for row in rows])
+
+    return max(score, start_score)
+
+
+def optimize_file(file_name, seconds, seed):
+    """ Runs one restart for given file, returns (score, starting score, output rows) """
+    first_row, streets, paths = read_file(file_name + ".txt")
+    city = City(first_row, streets, paths)
+    if os.path.exists(os.path.join("outputs", file_name + "_out.txt")):
+        schedule = read_output(city, file_name)
+    else:
+        schedule = read_schedule(city, get_solution(first_row, streets, paths))
+    start_score = simulate(city, schedule)
+    score, schedule = optimize(city, schedule, seconds=seconds, seed=seed)
+    print("%s [seed %d]: %d -> %d" % (file_name, seed, start_score, score))
+    return score, start_score, get_rows(city, schedule)
+
+
+def optimize(city, schedule, seconds=60, seed=0):
+    """
+    Local search over schedule cycles order and durations
+    :param seconds: float, default 60
+        Time budget
+    :param seed: int, default 0
+        Random seed
+    :return: tuple
+        (score, schedule) with the best schedule found
+    """
+    rnd = random.Random(seed)
+    sim = IncrementalSimulation(city, schedule)
+    # Only intersections with more than one street can be improved
+    candidates = [i for i, cycle in sim.schedule.items() if len(cycle) > 1]
+    if not candidates:
+        return sim.score, sim.schedule
+    weights = [len(sim.cars_at.get(i, [])) + 1 for i in candidates]
+
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        i = rnd.choices(candidates, weights)[0]
+        cycle = get_move(sim.schedule[i], rnd)
+        if cycle is None:
+            continue
+        # Change is only recomputed again if it has to be rolled back
+        if sim.propose(i, cycle) >= 0:
+            sim.commit()
+        else:
+            sim.rollback()
+
+    return sim.score, sim.schedule
+
+
+def get_move(cycle, rnd):
+    """ Returns a random neighbour of given cycle, or None if the drawn move is not valid """
+    cycle = list(cycle)
+    a = rnd.randrange(len(cycle))
+    if rnd.random() < 0.5:
+        b = rnd.randrange(len(cycle))
+        if a == b:
+            return None
+        cycle[a], cycle[b] = cycle[b], cycle[a]
+    else:
+        s, d = cycle[a]
+        d += rnd.choice((-1, 1))
+        if d < 1:
+            return None
+        cycle[a] = (s, d)
+
+    return cycle
+
+
+if __name__ == "__main__":
+    n_proc = multiprocessing.cpu_count()
+    for f in sys.argv[1:] or ("a", "b", "c", "d", "e", "f"):
+        run(f, seconds=60, n_jobs=n_proc)
@@ -0,0 +1,111 @@
+"""
+On-disk result cache shared by the qualification rounds runners.
+
+qual2018/result_cache.py is a symlink to this module, so both rounds import the same code, and both store their
+entries in the .cache/results folder at the repository root. Results are keyed by a hash of the input file contents,
+the solver source files, the solver variant and its parameters, so changing the solver code invalidates its results.
+Each entry stores the solver output and its score. Entries are JSON files in the cache directory; when the directory
+grows above max_bytes, least recently used entries are removed. Temporary files of writes that never finished (the
+worker was killed) count towards max_bytes and are removed once they are older than TMP_MAX_AGE seconds.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "results")
+TMP_MAX_AGE = 3600
+
+
+class ResultCache:
+
+    def __init__(self, sources=(), directory=CACHE_DIR, max_bytes=512 * 2 ** 20):
+        """
+        :param sources: iterable of str
+            Paths of the source files the results depend on
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        h = hashlib.sha256()
+        for path in sources:
+            update_hash(h, path)
+        self.solver_version = h.hexdigest()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, input_path, variant, params):
+        """ Hash of input file contents, solver sources, solver variant and parameters """
+        h = hashlib.sha256()
+        update_hash(h, input_path)
+        h.update(json.dumps([self.solver_version, variant, params], sort_keys=True).encode())
+        return h.hexdigest()
+
+    def get(self, input_path, variant, params):
+        """ Returns (output, score) for a cached result, None if it was not computed yet """
+        path = self._path(self.key(input_path, variant, params))
+        try:
+            with open(path, "r") as f_obj:
+                entry = json.load(f_obj)
+        except (OSError, ValueError):
+            return None
+        # Mark entry as recently used
+        os.utime(path)
+        return entry["output"], entry["score"]
+
+    def put(self, input_path, variant, params, output, score):
+        """ Stores output and score of a result """
+        entry = {"input": os.path.basename(input_path), "variant": variant, "params": params, "score": score,
+                 "output": output}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f_obj:
+                json.dump(entry, f_obj)
+            # Replaced atomically, so concurrent workers never read partial entries
+            os.replace(tmp_path, self._path(self.key(input_path, variant, params)))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        """ Removes stale temporary files and least recently used entries until cache size is below max_bytes """
+        entries = []
+        size = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith((".json", ".tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                if name.endswith(".tmp") and now - st.st_mtime > TMP_MAX_AGE:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            size += st.st_size
+            # Recent temporary files may still be written by another worker
+            if name.endswith(".json"):
+                entries.append((st.st_mtime, st.st_size, name))
+
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            size -= entry_size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+def update_hash(h, path):
+    """ Updates hash h with the contents of given file """
+    with open(path, "rb") as f_obj:
+        for chunk in iter(lambda: f_obj.read(2 ** 20), b""):
+            h.update(chunk)
@@ -0,0 +1,75 @@
+"""
+Sharded schedule construction for large cities.
+
+Car paths are streamed from the input file while they are filtered and counted, in a single pass, so memory is bounded
+by the number of streets and intersections rather than by the number and length of car paths (with by_arrival, the
+arrival histograms also grow with the number of distinct arrival times per street). Once street counts are known, the
+schedule of each intersection only depends on its own streets. Intersections are split into shards that are built by
+a process pool: each worker streams the schedule rows of its shard into a part file, and parts are then concatenated
+into the output file, so the full list of output rows is never held in memory.
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from main import read_streets, iter_paths, get_path_time, get_street_counts, get_schedules
+
+# Street statistics, set in the main process before the pool is created
+_state = {}
+
+
+def init_worker(state):
+    _state.update(state)
+
+
+def write_shard(task):
+    """ Writes the schedule rows of given (intersections, part path) task """
+    intersections, part_path = task
+    int_streets = _state["int_streets"]
+    with open(part_path, "w") as f_obj:
+        for i in intersections:
+            _int_st = int_streets[i]
+            schedules = get_schedules(_int_st, _state["street_cnt"], _state["street_cnt_b"], _state["D"],
+                                      scale=_state["scale"], arrivals=_state["arrivals"])
+            f_obj.write("%d\n%d\n" % (i, len(_int_st)))
+            f_obj.writelines([row + "\n" for row in schedules])
+
+    return part_path
+
+
+def run(file_name, n_jobs=None, shards_per_job=4, factor=1.0, scale=0.3, by_arrival=False):
+    """ Solves given file building the intersections schedules in parallel shards """
+    first_row, streets = read_streets(file_name + ".txt")
+    D = first_row[0]
+    streets_t = {s[2]: s[3] for s in streets}
+    paths = (p for p in iter_paths(file_name + ".txt", first_row[2]) if get_path_time(p, streets_t) <= D * factor)
+    street_cnt, street_cnt_b, int_streets, arrivals = get_street_counts(
+        first_row, streets, paths, by_arrival=by_arrival)
+    state = {"street_cnt": street_cnt, "street_cnt_b": street_cnt_b, "int_streets": int_streets,
+             "arrivals": arrivals, "D": D, "scale": scale}
+
+    n_jobs = n_jobs or multiprocessing.cpu_count()
+    n_shards = min(len(int_streets), n_jobs * shards_per_job) or 1
+    intersections = list(int_streets)
+    shards = [intersections[k::n_shards] for k in range(n_shards)]
+
+    with tempfile.TemporaryDirectory(dir="outputs") as tmp_dir:
+        tasks = [(shard, os.path.join(tmp_dir, "part_%d.txt" % k)) for k, shard in enumerate(shards)]
+        with multiprocessing.Pool(n_jobs, initializer=init_worker, initargs=(state,)) as pool:
+            with open(os.path.join("outputs", file_name + "_out.txt"), "w") as f_obj:
+                f_obj.write("%d\n" % len(int_streets))
+                # Parts are appended in order, as soon as each one is finished
+                for part_path in pool.imap(write_shard, tasks):
+                    with open(part_path, "r") as part:
+                        shutil.copyfileobj(part, f_obj)
+                    os.remove(part_path)
+
+
+if __name__ == "__main__":
+    for f in sys.argv[1:] or ("a", "b", "c", "d", "e", "f"):
+        t0 = time.time()
+        run(f)
+        print("%s: ran in %.2f seconds" % (f, time.time() - t0))
@@ -0,0 +1,134 @@
+"""
+Local simulator and scorer for the 2021 qualification round (traffic signaling).
+
+Streets, intersections and cars are mapped to integer indexes and the simulation is event driven: instead of
+scanning every street at every second, each car is pushed into a heap keyed by the time it reaches the end of a
+street. Since each street queue is FIFO, a car crosses at the first green second after both its arrival and the
+crossing of the car ahead of it in the queue.
+"""
+import heapq
+
+
+class City:
+
+    def __init__(self, first_row, streets, paths):
+        """ Integer indexed representation of the input returned by read_file """
+        self.D, self.I, self.S, self.V, self.F = first_row
+        self.street_names = [s[2] for s in streets]
+        self.street_ids = {name: n for n, name in enumerate(self.street_names)}
+        self.street_start = [s[0] for s in streets]
+        self.street_end = [s[1] for s in streets]
+        self.street_len = [s[3] for s in streets]
+        self.paths = [[self.street_ids[s] for s in p[1:]] for p in paths]
+
+
+def read_schedule(city, rows):
+    """
+    Parses a solution, given as the rows returned by get_solution or the lines of an output file
+    :return: dict
+        intersection -> list of (street id, green duration), in cycle order
+    """
+    rows = [str(r).strip() for r in rows]
+    rows = [r for r in rows if r]
+    schedule = {}
+    pos = 1
+    for _ in range(int(rows[0])):
+        i = int(rows[pos])
+        n = int(rows[pos + 1])
+        cycle = []
+        for row in rows[pos + 2:pos + 2 + n]:
+            name, duration = row.split()
+            cycle.append((city.street_ids[name], int(duration)))
+        schedule[i] = cycle
+        pos += 2 + n
+
+    return schedule
+
+
+def get_rows(city, schedule):
+    """ Converts schedule into output file rows, in the same format returned by get_solution """
+    rows = [0]
+    for i, cycle in schedule.items():
+        cycle = [(s, d) for s, d in cycle if d > 0]
+        if cycle:
+            rows += [i, len(cycle), *["%s %s" % (city.street_names[s], d) for s, d in cycle]]
+            rows[0] += 1
+
+    return rows
+
+
+def get_green_windows(city, schedule):
+    """
+    Computes, for each street, the green light window inside its intersection cycle
+    :return: list
+        (cycle length, window start, window duration) per street id, None for streets that are never green
+    """
+    windows = [None] * city.S
+    for i, cycle in schedule.items():
+        cycle = [(s, d) for s, d in cycle if d > 0]
+        cycle_len = sum(d for _, d in cycle)
+        start = 0
+        for s, d in cycle:
+            windows[s] = (cycle_len, start, d)
+            start += d
+
+    return windows
+
+
+def next_green(window, t):
+    """ First second >= t in which the light is green, None if it never gets green """
+    if window is None:
+        return None
+    cycle_len, start, duration = window
+    k = t % cycle_len
+    if k < start:
+        return t + start - k
+    if k < start + duration:
+        return t
+    return t + cycle_len - k + start
+
+
+def simulate(city, schedule, timelines=False):
+    """
+    Simulates given schedule
+    :param timelines: bool, default False
+        If True, also returns the arrival and crossing times of each car at each one of its path streets
+    :return: int or tuple
+        Score, or (score, arrivals, crossings, finish) when timelines is True. crossings[car][step] is None when the
+        car does not cross the end of that street up to time D, and finish[car] is None when the car does not finish.
+    """
+    D, F = city.D, city.F
+    street_len = city.street_len
+    paths = city.paths
+    windows = get_green_windows(city, schedule)
+    free = [0] * city.S
+    arrivals = [[None] * (len(p) - 1) for p in paths]
+    crossings = [[None] * (len(p) - 1) for p in paths]
+    finish = [None] * len(paths)
+
+    # Events are (arrival time, car, step), which is also the order in which cars are queued in a street
+    events = [(0, car, 0) for car in range(len(paths))]
+    score = 0
+    while events:
+        t, car, step = heapq.heappop(events)
+        path = paths[car]
+        s = path[step]
+        arrivals[car][step] = t
+        crossing = next_green(windows[s], max(t, free[s]))
+        if crossing is None or crossing >= D:
+            continue
+        free[s] = crossing + 1
+        crossings[car][step] = crossing
+        arrival = crossing + street_len[path[step + 1]]
+        if arrival > D:
+            continue
+        if step + 2 == len(path):
+            finish[car] = arrival
+            score += F + D - arrival
+        else:
+            heapq.heappush(events, (arrival, car, step + 1))
+
+    if timelines:
+        return score, arrivals, crossings, finish
+
+    return score
@@ -0,0 +1,77 @@
+"""
+Parallel hyperparameter sweep over get_solution parameters.
+
+Each input is parsed once, in the main process, and shared with the pool workers (they are forked with it already
+loaded). Every (input, factor, scale, by_arrival) combination is solved and scored in the pool, skipping the ones
+already in the result cache, the best schedule per input is written to the outputs folder and every result is
+appended to outputs/sweep.csv, so different runs can be compared.
+"""
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import main
+
+FACTORS = (0.6, 0.8, 0.9, 1.0, 1.2)
+SCALES = (0.1, 0.2, 0.3, 0.5, 1.0)
+BY_ARRIVAL = (False, True)
+
+# Parsed inputs, set in the main process before the pool is created
+_inputs = {}
+
+
+def init_worker(inputs):
+    _inputs.update(inputs)
+
+
+def solve(file_name, factor, scale, by_arrival):
+    """ Solves and scores given file with given parameters """
+    _, score = main.solve(file_name, factor=factor, scale=scale, by_arrival=by_arrival, inputs=_inputs[file_name])
+    return file_name, factor, scale, by_arrival, score
+
+
+def sweep(file_names, factors=FACTORS, scales=SCALES, by_arrival=BY_ARRIVAL, n_jobs=None):
+    """
+    Solves every (file, factor, scale, by_arrival) combination and writes the best solution for each file
+    :return: dict
+        file name -> (score, factor, scale, by_arrival) of the best solution
+    """
+    inputs = {f: main.read_file(f + ".txt") for f in file_names}
+    tasks = list(itertools.product(file_names, factors, scales, by_arrival))
+    n_jobs = n_jobs or multiprocessing.cpu_count()
+    with multiprocessing.Pool(n_jobs, initializer=init_worker, initargs=(inputs,)) as pool:
+        results = pool.starmap(solve, tasks, chunksize=1)
+
+    save_results(results)
+    best = {}
+    for f, factor, scale, arrival, score in results:
+        if f not in best or score > best[f][0]:
+            best[f] = (score, factor, scale, arrival)
+
+    for f, (score, factor, scale, arrival) in best.items():
+        main.run(f, factor=factor, scale=scale, by_arrival=arrival)
+        print("%s: %d (factor=%s, scale=%s, by_arrival=%s)" % (f, score, factor, scale, arrival))
+
+    return best
+
+
+def save_results(results, file_name="sweep.csv"):
+    """ Appends sweep results, tagged with the run time, to given file in outputs folder """
+    path = os.path.join("outputs", file_name)
+    new = not os.path.exists(path)
+    run_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    with open(path, "a", newline="") as f_obj:
+        writer = csv.writer(f_obj)
+        if new:
+            writer.writerow(["run", "input", "factor", "scale", "by_arrival", "score"])
+        writer.writerows([(run_time, *r) for r in results])
+
+
+if __name__ == "__main__":
+    t0 = time.time()
+    best = sweep(sys.argv[1:] or ["a", "b", "c", "d", "e", "f"])
+    print("Total: %d" % sum(b[0] for b in best.values()))
+    print("Ran in %.2f seconds" % (time.time() - t0))